@@ -0,0 +1,158 @@
+"""
+analytics_store.py
+Objective : columnar store of completed runs for cross run analytics
+    - every completed run appends its products and key insights as Parquet
+    - layout : ANALYTICS_DIR/<table>/category=<category>/month=<YYYY-MM>/<run_id>.parquet
+    - queries read only the partitions matching category / month filters
+"""
+
+import os
+import uuid
+import logging
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import config
+from utils import extract_market_insights, flatten_product_summaries, product_brand
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_TABLE = "products"
+INSIGHTS_TABLE = "insights"
+
+# explicit schemas, an inferred one turns an all-None column into null type and
+# files of one table can no longer be read together
+SCHEMAS = {
+    PRODUCTS_TABLE: pa.schema([
+        ("run_id", pa.string()),
+        ("start_date", pa.string()),
+        ("end_date", pa.string()),
+        ("product_name", pa.string()),
+        ("brand", pa.string()),
+        ("key_feature", pa.string()),
+        ("trending_driver", pa.string()),
+    ]),
+    INSIGHTS_TABLE: pa.schema([
+        ("run_id", pa.string()),
+        ("start_date", pa.string()),
+        ("end_date", pa.string()),
+        ("insight_no", pa.int64()),
+        ("insight", pa.string()),
+        ("evidence_count", pa.int64()),
+        ("product_evidence", pa.string()),
+    ]),
+}
+# partition columns, read back from the directory names
+PARTITION_FIELDS = [("category", pa.string()), ("month", pa.string())]
+
+
+def _partition_dir(table: str, category: str, month: str) -> str:
+    return os.path.join(config.ANALYTICS_DIR, table, f"category={category}", f"month={month}")
+
+def _write_partition(table: str, category: str, month: str, run_id: str, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    path = _partition_dir(table, category, month)
+    os.makedirs(path, exist_ok=True)
+    # partition columns live in the directory names, not in the file
+    table_data = pa.Table.from_pylist(rows, schema=SCHEMAS[table])
+    pq.write_table(table_data, os.path.join(path, f"{run_id}.parquet"))
+
+def _text(value: Any) -> Optional[str]:
+    """LLM fields can be lists / numbers, text columns always store a string or None"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return "; ".join(str(v) for v in value)
+    return str(value)
+
+def _product_rows(run_id: str, start_date: str, end_date: str, product_summaries) -> List[Dict[str, Any]]:
+    rows = []
+    for item in flatten_product_summaries(product_summaries):
+        if not isinstance(item, dict):
+            continue
+        name = _text(item.get("Product_Name"))
+        rows.append({
+            "run_id": run_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "product_name": name,
+            "brand": product_brand(name),
+            "key_feature": _text(item.get("Key_Feature")),
+            "trending_driver": _text(item.get("Trending_Driver")),
+        })
+    return rows
+
+def _insight_rows(run_id: str, start_date: str, end_date: str, final_report) -> List[Dict[str, Any]]:
+    if not isinstance(final_report, dict):
+        return []
+    rows = []
+    for i, item in enumerate(extract_market_insights(final_report)):
+        if not isinstance(item, dict):
+            continue
+        evidence = item.get("Product_Evidence") or []
+        names = [e.get("Product_Name") if isinstance(e, dict) else e for e in evidence]
+        rows.append({
+            "run_id": run_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "insight_no": i + 1,
+            "insight": _text(item.get("Insight")),
+            "evidence_count": len(names),
+            "product_evidence": "; ".join(str(n) for n in names if n),
+        })
+    return rows
+
+def append_run(result: Dict[str, Any], category: str, start_date: str, end_date: str,
+               run_id: Optional[str] = None) -> str:
+    """
+    append final_product_summaries and key insights of a completed run
+    the month partition is taken from start_date, return the run id
+    """
+    run_id = run_id or uuid.uuid4().hex
+    month = start_date[:7]
+    _write_partition(PRODUCTS_TABLE, category, month, run_id,
+                     _product_rows(run_id, start_date, end_date, result.get("final_product_summaries")))
+    _write_partition(INSIGHTS_TABLE, category, month, run_id,
+                     _insight_rows(run_id, start_date, end_date, result.get("final_report")))
+    logger.info(f"[ANALYTICS] stored run {run_id} for {category} | {month}")
+    return run_id
+
+def _query(table: str, categories: Optional[List[str]], months: Optional[List[str]],
+           columns: Optional[List[str]]) -> pd.DataFrame:
+    path = os.path.join(config.ANALYTICS_DIR, table)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns)
+    filters = []
+    if categories:
+        filters.append(("category", "in", list(categories)))
+    if months:
+        filters.append(("month", "in", list(months)))
+    # hive partition filters prune directories before any file is read
+    # read with the table schema, so files written before the schema was fixed still load
+    schema = pa.schema(list(SCHEMAS[table]) + PARTITION_FIELDS)
+    return pd.read_parquet(path, engine="pyarrow", columns=columns, filters=filters or None, schema=schema)
+
+def query_products(categories: Optional[List[str]] = None, months: Optional[List[str]] = None,
+                   columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """products of stored runs, months as "YYYY-MM" """
+    return _query(PRODUCTS_TABLE, categories, months, columns)
+
+def query_insights(categories: Optional[List[str]] = None, months: Optional[List[str]] = None,
+                   columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """key insights of stored runs, months as "YYYY-MM" """
+    return _query(INSIGHTS_TABLE, categories, months, columns)
+
+def brands_in_every_month(category: str, months: List[str]) -> List[str]:
+    """
+    brands present in category for every one of months
+    e.g. brands_in_every_month("Energy Drinks", ["2025-01", "2025-02", "2025-03"])
+    """
+    df = query_products([category], months, columns=["brand", "month"])
+    if df.empty:
+        return []
+    per_brand = df.dropna(subset=["brand"]).groupby("brand")["month"].nunique()
+    return sorted(per_brand[per_brand == len(set(months))].index)
@@ -6,147 +6,188 @@ from datetime import date
 # Assuming these are your custom modules
 import config
 from graph_state import AgentState
-from workflow import build_workflow, run_graph
+from workflow import build_workflow, run_graph, list_runs, new_thread_id, AsyncSqliteSaver
 from cache_utils import *
 from utils import *
+from warmup import record_access
 
 
-# --- Page Rendering Functions ---
+# --- View Models ---
 
-def market_insights_page(report_data):
-    """Render the Market Insights and Product Evidence section."""
-    st.header("🔍 Market Insights & Product Evidence")
+def build_report_view(final_report, product_summaries):
+    """
+    Normalize a report into the structures the pages render, so
+    DataFrames and flattened lists are built once per report.
+    """
+    view = {"insights": [], "brand_actions": [], "store_strategy": [], "products_df": None, "errors": {}}
 
     try:
-        insights_list = extract_market_insights(report_data)
-        st.markdown(f"**{len(insights_list)}** Key Insights. Click to view details.")
-
-        for i, insight_item in enumerate(insights_list):
-            insight_text = insight_item.get('Insight', 'No insight text available.')
+        for i, insight_item in enumerate(extract_market_insights(final_report)):
             product_evidence = insight_item.get('Product_Evidence')
+            insight = {"title": f"📌 **Insight {i+1}:** {insight_item.get('Insight', 'No insight text available.')}",
+                       "evidence_df": None, "evidence_list": None}
+            # Check if product_evidence is a list of dictionaries
+            if product_evidence and isinstance(product_evidence, list) and isinstance(product_evidence[0], dict):
+                insight["evidence_df"] = pd.DataFrame(product_evidence).rename(columns={
+                    'Product_Name': 'Product/Flavor',
+                    'Key_Feature': 'Key Feature/Note',
+                    'Trending_Driver': 'Market Trend Driver'
+                })
+            # Handles the case where product_evidence is a simple list of strings
+            elif isinstance(product_evidence, list):
+                insight["evidence_list"] = product_evidence
+            view["insights"].append(insight)
+    except (TypeError, KeyError, IndexError, AttributeError) as e:
+        view["errors"]["insights"] = str(e)
 
-            with st.expander(f"📌 **Insight {i+1}:** {insight_text}", expanded=False):
-                # CORRECTED: Check if product_evidence is a list of dictionaries
-                if product_evidence and isinstance(product_evidence, list) and isinstance(product_evidence[0], dict):
-                    products_df = pd.DataFrame(product_evidence)
-                    products_df.rename(columns={
-                        'Product_Name': 'Product/Flavor',
-                        'Key_Feature': 'Key Feature/Note',
-                        'Trending_Driver': 'Market Trend Driver'
-                    }, inplace=True)
-                    
-                    st.subheader(f"Product Evidence ({len(products_df)} Items)")
-                    st.dataframe(
-                        products_df,
-                        use_container_width=True,
-                        hide_index=True
-                    )
-                # CORRECTED: Handles the case where product_evidence is a simple list of strings
-                elif isinstance(product_evidence, list):
-                    st.markdown("- " + "\n- ".join(product_evidence))
-                else:
-                    st.warning("Product evidence data is not in a recognized format.")
+    try:
+        actions = final_report.get('Actionable_Strategy', {}).get('Recommended_Actions', {})
+        if isinstance(actions, dict):
+            view["brand_actions"] = actions.get('Industry_Brand_Perspective') or actions.get('Industry_Strategy') or []
+        else:
+            view["brand_actions"] = actions or []
+    except Exception as e:
+        view["errors"]["brand_actions"] = str(e)
 
-    except (TypeError, KeyError, IndexError) as e:
-        st.error(f"An error occurred while displaying market insights. Please check the data format. Error: {e}")
+    try:
+        view["store_strategy"] = extract_store_strategy(final_report) or []
+    except Exception as e:
+        view["errors"]["store_strategy"] = str(e)
+
+    try:
+        flat_product_list = flatten_product_summaries(product_summaries)
+        if flat_product_list:
+            df_base = pd.DataFrame(flat_product_list).rename(columns={
+                'Product_Name': 'Product/Flavor',
+                'Key_Feature': 'Key Feature/Note',
+                'Trending_Driver': 'Raw Trend Driver'
+            })
+            # Ensure essential columns exist to prevent KeyErrors
+            display_cols = ['Product/Flavor', 'Raw Trend Driver', 'Key Feature/Note']
+            for col in display_cols:
+                if col not in df_base.columns:
+                    df_base[col] = "N/A"
+            view["products_df"] = df_base[display_cols]
+    except Exception as e:
+        view["errors"]["products"] = str(e)
+
+    return view
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_report_view(cache_key, version, _final_report, _product_summaries):
+    """
+    Memoized build_report_view, keyed by cache key and entry version only
+    (underscore args are not hashed by Streamlit).
+    """
+    return build_report_view(_final_report, _product_summaries)
 
 
-def actionable_strategy_page(report_data):
+def paginate(items, key):
+    """Return the slice of items for the page selected in a small page picker."""
+    page_size = config.DASHBOARD_PAGE_SIZE
+    pages = max(1, -(-len(items) // page_size))
+    if pages == 1:
+        return items, 0
+    page = st.number_input(f"Page (1-{pages})", min_value=1, max_value=pages, value=1, key=key)
+    offset = (page - 1) * page_size
+    return items[offset:offset + page_size], offset
+
+
+# --- Page Rendering Functions ---
+
+def market_insights_page(view):
+    """Render the Market Insights and Product Evidence section."""
+    st.header("🔍 Market Insights & Product Evidence")
+
+    if "insights" in view["errors"]:
+        st.error(f"An error occurred while displaying market insights. Please check the data format. Error: {view['errors']['insights']}")
+        return
+
+    insights_list = view["insights"]
+    st.markdown(f"**{len(insights_list)}** Key Insights. Click to view details.")
+    page_items, _ = paginate(insights_list, key="insights_page")
+
+    for insight in page_items:
+        with st.expander(insight["title"], expanded=False):
+            if insight["evidence_df"] is not None:
+                st.subheader(f"Product Evidence ({len(insight['evidence_df'])} Items)")
+                st.dataframe(
+                    insight["evidence_df"],
+                    use_container_width=True,
+                    hide_index=True
+                )
+            elif insight["evidence_list"] is not None:
+                st.markdown("- " + "\n- ".join(insight["evidence_list"]))
+            else:
+                st.warning("Product evidence data is not in a recognized format.")
+
+
+def actionable_strategy_page(view):
     """Show actionable strategy data."""
     st.header("💡 Actionable Strategies")
     tab1, tab2 = st.tabs(["Brand/Industry Perspective", "Store Owner Placement"])
     
     with tab1:
         st.subheader("Recommended Actions for Brands/Producers")
-        try:
-            actions = report_data.get('Actionable_Strategy', {}).get('Recommended_Actions', {})
-            if isinstance(actions,dict) and (len(actions)>=0):
-                brand_actions = (report_data.get('Actionable_Strategy', {}).get('Recommended_Actions', {}).get('Industry_Brand_Perspective') or
-                             report_data.get('Actionable_Strategy', {}).get('Recommended_Actions', {}).get('Industry_Strategy'))
-            else:
-                brand_actions = actions
-
-
-        
-            
-            if brand_actions:
-                 st.markdown(
-                    "\n".join([f"- {action}" for action in brand_actions])
-                )
-            else:
-                st.info("No brand/industry perspective actions found.")
-        except Exception as e:
-            st.error(f"Oops, an error occurred while loading brand strategies: {e}")
+        if "brand_actions" in view["errors"]:
+            st.error(f"Oops, an error occurred while loading brand strategies: {view['errors']['brand_actions']}")
+        elif view["brand_actions"]:
+            st.markdown(
+                "\n".join([f"- {action}" for action in view["brand_actions"]])
+            )
+        else:
+            st.info("No brand/industry perspective actions found.")
 
     with tab2:
         st.subheader("Placement Strategies for Store Owners")
-        try:
-            store_strategy = extract_store_strategy(report_data)
-            if store_strategy:
-                for strategy in store_strategy:
-                    expanded_state = (strategy.get('Focus') == 'Core Sales Volume')
-                    with st.expander(f"⭐ **Focus: {strategy.get('Focus', 'N/A')}**", expanded=expanded_state):
-                        st.markdown(f"**Action:** {strategy.get('Action', 'N/A')}")
-                        products = strategy.get('Products', [])
-                        if products:
-                            st.markdown(f"**Target Products:** {', '.join(products)}")
-            else:
-                st.info("No store owner placement strategies found.")
-        except Exception as e:
-            st.error(f"Oops, an error occurred while loading store strategies: {e}")
-
-
-def product_summary_page(full_data):
+        if "store_strategy" in view["errors"]:
+            st.error(f"Oops, an error occurred while loading store strategies: {view['errors']['store_strategy']}")
+        elif view["store_strategy"]:
+            page_items, _ = paginate(view["store_strategy"], key="strategy_page")
+            for strategy in page_items:
+                expanded_state = (strategy.get('Focus') == 'Core Sales Volume')
+                with st.expander(f"⭐ **Focus: {strategy.get('Focus', 'N/A')}**", expanded=expanded_state):
+                    st.markdown(f"**Action:** {strategy.get('Action', 'N/A')}")
+                    products = strategy.get('Products', [])
+                    if products:
+                        st.markdown(f"**Target Products:** {', '.join(products)}")
+        else:
+            st.info("No store owner placement strategies found.")
+
+
+def product_summary_page(view):
     """
-    Generates the Product Level Summary tab, intelligently handling
-    different possible data structures from the cache.
+    Generates the Product Level Summary tab from the normalized
+    product table of the view model.
     """
     st.header("📦 Product Level Summary")
     st.subheader("Product Details by Trend Cluster")
-    
-    if not full_data or not isinstance(full_data, list):
-        st.warning("Product summary data is unavailable or in an incorrect format.")
-        return
 
-    flat_product_list = []
-    # Check for the nested structure: [{"analysis": [{"Product_Name": ...}]}]
-    if isinstance(full_data[0], dict) and "analysis" in full_data[0]:
-        for item in full_data:
-            if "analysis" in item and isinstance(item["analysis"], list):
-                flat_product_list.extend(item["analysis"])
-    # Assume the flat structure: [{"Product_Name": ...}]
-    else:
-        flat_product_list = full_data
-
-    if not flat_product_list:
+    if "products" in view["errors"]:
+        st.error(f"Could not generate product summary table. An error occurred: {view['errors']['products']}")
+        return
+    if view["products_df"] is None:
         st.info("No product details to display.")
         return
 
-    try:
-        df_base = pd.DataFrame(flat_product_list)
-        df_base.rename(columns={
-            'Product_Name': 'Product/Flavor',
-            'Key_Feature': 'Key Feature/Note',
-            'Trending_Driver': 'Raw Trend Driver'
-        }, inplace=True)
-        
-        # Ensure essential columns exist to prevent KeyErrors
-        display_cols = ['Product/Flavor', 'Raw Trend Driver', 'Key Feature/Note']
-        for col in display_cols:
-            if col not in df_base.columns:
-                df_base[col] = "N/A"
-
-        st.dataframe(
-            df_base[display_cols],
-            use_container_width=True,
-            hide_index=True
-        )
-    except Exception as e:
-        st.error(f"Could not generate product summary table. An error occurred: {e}")
+    # fixed height keeps the table virtualized for hundreds of products
+    st.dataframe(
+        view["products_df"],
+        use_container_width=True,
+        hide_index=True,
+        height=config.DASHBOARD_TABLE_HEIGHT
+    )
 
 
 # --- UI and Data Loading ---
 
+@st.cache_resource
+def start_cache_maintenance():
+    """Start the background cache compaction once per server process."""
+    return start_background_compaction()
+
+
 def user_input_config():
     """Set user input configuration and page heading."""
     st.set_page_config(page_title="Market Insights Dashboard", layout="wide")
@@ -171,23 +212,83 @@ def user_input_config():
     key_start = start_date.strftime("%Y-%m-%d")
     key_end = end_date.strftime("%Y-%m-%d")
     config.set_date_range(key_start, key_end)
-    
+
+    # log each selection once per session, warm-up prioritizes the most viewed ones
+    accessed = st.session_state.setdefault("accessed_selections", set())
+    if (category, key_start, key_end) not in accessed:
+        accessed.add((category, key_start, key_end))
+        record_access(category, key_start, key_end)
+
+    stats = cache_stats()
+    st.sidebar.caption(
+        f"Cache: {stats['entries']} entries, {stats['size_bytes'] / 1024:.0f} KB, "
+        f"{stats['evictions']} evicted"
+    )
+
+    # drop only the final report for this selection, upstream node outputs are reused
+    if st.sidebar.button("🔄 Refresh Final Report"):
+        invalidate("create_final_summary", category, key_start, key_end)
+        st.sidebar.success("Final report invalidated for this selection.")
+
     st.write(f"Displaying insights for **{category}** from **{key_start}** to **{key_end}**.")
     run_btn = st.button("🏃‍♂️ Run Analysis")
     return category, run_btn
 
 
-def get_data_output(category, run_btn):
-    """Return output either from cache or by running the pipeline."""
-    final_report, product_summaries = None, None
+@st.cache_data(ttl=60, show_spinner=False)
+def load_interrupted_runs():
+    """Unfinished checkpointed runs, cached so reruns don't open the checkpoint DB."""
+    return list_runs()
+
+
+def interrupted_runs_sidebar():
+    """List checkpointed runs that did not finish and return the run to resume, if any."""
+    if AsyncSqliteSaver is None:
+        return None
+    try:
+        runs = load_interrupted_runs()
+    except Exception as e:
+        st.sidebar.warning(f"Could not load checkpointed runs: {e}")
+        return None
+    if not runs:
+        return None
+
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Interrupted Runs")
+    for run in runs:
+        label = f"{run['category']} | {run['start_date']} - {run['end_date']}"
+        if run["live"]:
+            # still executing in another session, resuming would start a second run
+            st.sidebar.caption(f"{label} (running)")
+            continue
+        st.sidebar.caption(label)
+        if st.sidebar.button("▶️ Resume", key=f"resume_{run['thread_id']}"):
+            return run
+    return None
+
+
+def get_data_output(category, run_btn, resume_id=None):
+    """
+    Return (final_report, product_summaries, from_cache), either from cache,
+    a resumed run or by running the pipeline.
+    """
+    final_report, product_summaries, from_cache = None, None, False
     state = {"category": category}
 
-    final_cached = get_from_cache("create_final_summary", category, config.START_DATE, config.END_DATE)
-    product_summary_cache = get_from_cache("clean_products", category, config.START_DATE, config.END_DATE)
+    if resume_id:
+        with st.spinner("Resuming interrupted run from its last completed step... 🙏"):
+            try:
+                result = run_graph(state, thread_id=resume_id, resume=True)
+                load_interrupted_runs.clear()
+                return result.get("final_report"), result.get("final_product_summaries") or result.get("product_summaries"), False
+            except Exception as e:
+                st.error(f"An error occurred while resuming the run: {e}")
+                return None, None, False
+
+    final_cached = get_current_from_cache("create_final_summary", category, config.START_DATE, config.END_DATE)
+    product_summary_cache = get_current_from_cache("clean_products", category, config.START_DATE, config.END_DATE)
 
     if final_cached:
-        st.info("Final summary retrieved from cache.")
-        final_report = final_cached.get("final_report")
         # Product summaries can be in two different structures across two cache entries
         if product_summary_cache:
             # Handle both possible keys for product summaries
@@ -195,13 +296,27 @@ def get_data_output(category, run_btn):
         if not product_summaries:
             product_summaries = final_cached.get("final_product_summaries") or final_cached.get("product_summaries")
 
+    # nodes expire / get evicted on their own, a final summary without its
+    # product list is a miss for the whole report so the pipeline can rebuild it
+    if final_cached and product_summaries:
+        st.info("Final summary retrieved from cache.")
+        final_report = final_cached.get("final_report")
+        from_cache = True
+
     elif run_btn:
         with st.spinner("Running pipeline — this may take 20–60s... Please wait 🙏"):
             try:
-                result = run_graph(state)
+                # checkpoint the run when possible so a crash can be resumed
+                thread_id = new_thread_id() if AsyncSqliteSaver is not None else None
+                try:
+                    result = run_graph(state, thread_id=thread_id)
+                finally:
+                    # a finished run is pruned, a crashed one shows up as interrupted
+                    load_interrupted_runs.clear()
                 if result:
                     final_report = result.get("final_report")
                     product_summaries = result.get("final_product_summaries") or result.get("product_summaries")
+                    from_cache = bool(result.get("_from_cache"))
                 else:
                     st.error("Pipeline did not return any results.")
             except Exception as e:
@@ -210,26 +325,43 @@ def get_data_output(category, run_btn):
     else:
         st.info("No cached result found. Click the 'Run Analysis' button to generate insights.")
 
-    return final_report, product_summaries
+    return final_report, product_summaries, from_cache
 
 
 def main():
     """Main function to run the Streamlit app."""
+    start_cache_maintenance()
     category, run_btn = user_input_config()
-    final_report, product_summary = get_data_output(category=category, run_btn=run_btn)
+    resume_run = interrupted_runs_sidebar()
+    resume_id = resume_run["thread_id"] if resume_run else None
+    final_report, product_summary, from_cache = get_data_output(category=category, run_btn=run_btn, resume_id=resume_id)
+    # a resumed run may belong to another category than the sidebar selection
+    report_category = resume_run["category"] if resume_run else category
 
     if final_report and product_summary:
+        if not isinstance(product_summary, list):
+            st.warning("Product summary data is unavailable or in an incorrect format.")
+        if from_cache:
+            # the report shown is the cached final summary and product list of the current selection
+            cache_key = _make_key("create_final_summary", report_category, config.START_DATE, config.END_DATE)
+            version = tuple(entry_version(node, report_category, config.START_DATE, config.END_DATE)
+                            for node in ("create_final_summary", "clean_products"))
+            view = load_report_view(cache_key, version, final_report, product_summary)
+        else:
+            # a freshly computed (maybe uncached, partial) report must not reuse a memoized view
+            view = build_report_view(final_report, product_summary)
+
         tab_insights, tab_strategy, tab_product_summary = st.tabs(
             ["Market Insights & Evidence", "Actionable Strategy", "Product Level Summary"])
         
         with tab_insights:
-            market_insights_page(final_report)
+            market_insights_page(view)
 
         with tab_strategy:
-            actionable_strategy_page(final_report)
+            actionable_strategy_page(view)
             
         with tab_product_summary:
-            product_summary_page(product_summary)
+            product_summary_page(view)
     else:
         st.markdown("---")
         if not run_btn:
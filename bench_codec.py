@@ -0,0 +1,66 @@
+"""
+bench_codec.py
+Objective : compare encode / decode time and size of the cache codecs
+on the real cache payloads (whole store and every single entry)
+Run : python bench_codec.py --cache cache.json --repeat 20
+"""
+
+import json
+import time
+from argparse import ArgumentParser
+
+import config
+import codec
+
+
+def _best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def bench(payload, repeat):
+    """
+    rows of (codec, encode ms, decode ms, size bytes) for payload
+    first row is the baseline: json with indent=2, how the cache was written before codecs
+    """
+    text = json.dumps(payload, indent=2).encode("utf-8")
+    rows = [("json-i2", _best_of(lambda: json.dumps(payload, indent=2).encode("utf-8"), repeat) * 1000,
+             _best_of(lambda: json.loads(text), repeat) * 1000, len(text))]
+    for name in codec.available_codecs():
+        data = codec.encode(payload, name)
+        encode_s = _best_of(lambda: codec.encode(payload, name), repeat)
+        decode_s = _best_of(lambda: codec.decode(data), repeat)
+        assert codec.decode(data) == payload, f"{name} did not round trip"
+        rows.append((name, encode_s * 1000, decode_s * 1000, len(data)))
+    return rows
+
+def _print(title, rows):
+    print(f"\n{title}")
+    print(f"{'codec':<10}{'encode ms':>12}{'decode ms':>12}{'size KB':>12}")
+    for name, enc, dec, size in rows:
+        print(f"{name:<10}{enc:>12.3f}{dec:>12.3f}{size / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--cache", default=config.CACHE_FILE, help="cache file to benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per measurement, best is kept")
+    args = parser.parse_args()
+
+    with open(args.cache, "rb") as f:
+        store = codec.decode(f.read())
+
+    _print(f"whole store ({len(store)} entries)", bench(store, args.repeat))
+
+    # per entry totals, the shape node_cache reads and writes
+    totals = {}
+    for value in store.values():
+        for name, enc, dec, size in bench(value, args.repeat):
+            t = totals.setdefault(name, [0.0, 0.0, 0])
+            t[0] += enc
+            t[1] += dec
+            t[2] += size
+    _print("sum over single entries", [(n, *t) for n, t in totals.items()])
@@ -2,21 +2,50 @@
 Cache_utils.py
 Objective : Implementation of CURD operations for Cache files
 Remember : Cache should be store in Reddis or some other DB, for example we store in JSON object
+
+Every cache entry also has a row in the index file (CACHE_INDEX_FILE) holding
+its node, category, date range, prompt version and model, so entries can be
+listed and dropped selectively instead of clearing the whole cache.
+The index row also tracks age, size and usage of the entry, which drives
+per-node TTL expiry, eviction under CACHE_MAX_BYTES and compaction.
+Files are written with the codec of config.CACHE_CODEC (see codec.py),
+plain JSON files from older versions are still read.
 """
 
 
-import json
 import os
-from typing import Any,Dict,Optional
+import time
+import logging
+import threading
+from typing import Any,Dict,List,Optional
 import config
 import hashlib
 from atomicwrites import atomic_write
+import codec
+
+logger = logging.getLogger(__name__)
 
 CACHE_FILE = config.CACHE_FILE
+CACHE_INDEX_FILE = config.CACHE_INDEX_FILE
+
+# order of the fields in an index row, queries match on any prefix of it
+INDEX_FIELDS = ("node", "category", "start_date", "end_date", "prompt_version", "model")
+
+# writers (set / invalidate / compaction) are serialized, readers never wait
+# because every write replaces the file atomically
+_write_lock = threading.RLock()
+
+# cache hits since the last index write, key => [last_access, hits]
+# kept in memory so reads never write, merged by the next writer / compaction
+_access: Dict[str,List[float]] = {}
+_access_lock = threading.Lock()
+
+# running counters reported by cache_stats()
+_stats = {"evictions": 0, "expired": 0, "last_compaction_seconds": None}
 
 if not os.path.exists(CACHE_FILE):
-    with open(CACHE_FILE,"w",encoding="utf-8") as f:
-        json.dump({},f)
+    with open(CACHE_FILE,"wb") as f:
+        f.write(codec.encode({}))
 
 def _make_key(node:str, category: str, start_date: str, end_date: str) ->str:
     """
@@ -25,53 +54,343 @@ def _make_key(node:str, category: str, start_date: str, end_date: str) ->str:
     raw_key = f"{node}:{category}:{start_date}:{end_date}"
     return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
 
-def _load_all() -> Dict[str,Any]:
+def _load_all(strict: bool = False) -> Dict[str,Any]:
     """
     load the cache file if file exist for query
     this reduce no LLM API calls, Hence the save cost
+    a file that cannot be decoded (corrupt, codec not installed) reads as empty,
+    writers pass strict=True so the error is raised instead of the store overwritten
     """
     try:
-        with open(CACHE_FILE,"r",encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
+        with open(CACHE_FILE,"rb") as f:
+            return codec.decode(f.read())
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        if strict:
+            raise
+        logger.error(f"[CACHE] could not read {CACHE_FILE}, treating it as empty: {e!r}")
         return {}
 
 def _save_all(cache: Dict[str,Any]) -> None:
     """
     saving file with atomic write, Do as follow
-    1. Create temp JSON file and write 
+    1. Create temp JSON file and write
     2. Replace main JSON file with temp JSON File
     """
-    with atomic_write(CACHE_FILE, overwrite=True, encoding="utf-8") as f:
-        json.dump(cache, f, indent=2)
+    with atomic_write(CACHE_FILE, mode="wb", overwrite=True) as f:
+        f.write(codec.encode(cache))
+
+def _load_index(strict: bool = False) -> Dict[str,Dict[str,Any]]:
+    """
+    load the index file, mapping cache key => index row
+    entries written before the index existed have no row
+    decode errors are handled as in _load_all
+    """
+    try:
+        with open(CACHE_INDEX_FILE,"rb") as f:
+            return codec.decode(f.read())
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        if strict:
+            raise
+        logger.error(f"[CACHE] could not read {CACHE_INDEX_FILE}, treating it as empty: {e!r}")
+        return {}
 
+def _save_index(index: Dict[str,Dict[str,Any]]) -> None:
+    """saving index file with atomic write"""
+    with atomic_write(CACHE_INDEX_FILE, mode="wb", overwrite=True) as f:
+        f.write(codec.encode(index))
 
-def get_from_cache(node:str, category:str, start_date: str, end_date: str) -> Optional[Any]:
+def _is_current(row: Optional[Dict[str,Any]], prompt_version: Optional[str], model: Optional[str]) -> bool:
+    """
+    check index row against requested prompt version and model
+    legacy entries (no row, or a row adopted by compaction without these
+    fields) are always treated as current
+    """
+    if row is None:
+        return True
+    if prompt_version is not None and row.get("prompt_version") not in (None, prompt_version):
+        return False
+    # the check is against the model the node asked for, "model" holds the one that answered
+    if model is not None and row.get("requested_model", row.get("model")) not in (None, model):
+        return False
+    return True
+
+def _entry_size(value: Any) -> int:
+    """approximate bytes taken by a value in the store"""
+    return len(codec.encode(value))
+
+def _is_expired(row: Optional[Dict[str,Any]], now: Optional[float] = None) -> bool:
+    """
+    check if an entry is older than the TTL of its node
+    legacy entries without created_at never expire until compaction adopts them
+    """
+    if not row or row.get("created_at") is None:
+        return False
+    ttl = config.CACHE_TTL_SECONDS.get(row.get("node"), config.CACHE_DEFAULT_TTL_SECONDS)
+    now = time.time() if now is None else now
+    return now - row["created_at"] > ttl
+
+def _record_access(key: str) -> None:
+    """remember a cache hit in memory, see _merge_access"""
+    with _access_lock:
+        usage = _access.setdefault(key, [0.0, 0])
+        usage[0] = time.time()
+        usage[1] += 1
+
+def _merge_access(index: Dict[str,Dict[str,Any]]) -> None:
+    """apply the in-memory hits to index rows, called by writers before saving"""
+    with _access_lock:
+        pending = dict(_access)
+        _access.clear()
+    for key, (last_access, hits) in pending.items():
+        if key in index:
+            index[key]["last_access"] = max(index[key].get("last_access", 0), last_access)
+            index[key]["hits"] = index[key].get("hits", 0) + hits
+
+def _evict(cache: Dict[str,Any], index: Dict[str,Dict[str,Any]], keep: Optional[str] = None) -> int:
+    """
+    evict entries until the store fits CACHE_MAX_BYTES
+    lru => oldest last_access first, lfu => fewest hits first
+    keep : key just written, never evicted by its own write
+    return number of evicted entries
+    """
+    total = sum(row.get("size_bytes", 0) for key, row in index.items() if key in cache)
+    if total <= config.CACHE_MAX_BYTES:
+        return 0
+
+    if config.CACHE_EVICTION_POLICY == "lfu":
+        order = lambda key: (index[key].get("hits", 0), index[key].get("last_access", 0))
+    else:
+        order = lambda key: index[key].get("last_access", 0)
+
+    evicted = 0
+    for key in sorted((k for k in index if k in cache and k != keep), key=order):
+        if total <= config.CACHE_MAX_BYTES:
+            break
+        total -= index[key].get("size_bytes", 0)
+        cache.pop(key, None)
+        index.pop(key, None)
+        evicted += 1
+    _stats["evictions"] += evicted
+    if evicted:
+        logger.info(f"[CACHE EVICT] {evicted} entries ({config.CACHE_EVICTION_POLICY}) - store now {total} bytes")
+    return evicted
+
+def get_from_cache(node:str, category:str, start_date: str, end_date: str,
+                   prompt_version: Optional[str] = None, model: Optional[str] = None) -> Optional[Any]:
     """
     Get the data from cache if we have same query
+    if prompt_version / model are given, entry built with other version is a miss
+    expired entries are a miss as well
     """
     cache = _load_all()
     key = _make_key(node,category,start_date,end_date)
     print(key)
+    if key not in cache:
+        return None
+    index = _load_index()
+    row = index.get(key)
+    if not _is_current(row, prompt_version, model) or _is_expired(row):
+        return None
+
+    if row is not None:
+        _record_access(key)
     return cache.get(key)
 
-def set_to_cache(node: str, category: str, start_date: str, end_date: str, value:Any) -> None:
+def get_current_from_cache(node:str, category:str, start_date: str, end_date: str) -> Optional[Any]:
     """
-    setting value of cache for node
+    get_from_cache limited to entries built with the current PROMPT_VERSION
+    and node model, the check every pipeline / dashboard lookup must use
     """
-    cache = _load_all()
-    key = _make_key(node, category,start_date,end_date)
-    cache[key] = value
-    _save_all(cache)
+    return get_from_cache(node, category, start_date, end_date,
+                          prompt_version=config.PROMPT_VERSION, model=config.node_model(node))
 
-def clear_cache() -> None:
-    "remove cache file from local dir"
-    if os.path.exists(config.CACHE_FILE):
-        os.remove(config.CACHE_FILE)
+def has_current_entry(node:str, category:str, start_date: str, end_date: str) -> bool:
+    """
+    True if the index has a current, unexpired entry, like get_current_from_cache
+    but read from the index only, so the check loads no values and records no hit
+    """
+    row = _load_index().get(_make_key(node,category,start_date,end_date))
+    if row is None:
+        return False
+    return _is_current(row, config.PROMPT_VERSION, config.node_model(node)) and not _is_expired(row)
+
+def set_to_cache(node: str, category: str, start_date: str, end_date: str, value:Any,
+                 prompt_version: Optional[str] = None, model: Optional[str] = None,
+                 requested_model: Optional[str] = None) -> None:
+    """
+    setting value of cache for node and record it in the index
+    model is the model that answered, requested_model the node default it was routed from
+    evicts other entries if the store grows over CACHE_MAX_BYTES
+    """
+    with _write_lock:
+        cache = _load_all(strict=True)
+        index = _load_index(strict=True)
+        key = _make_key(node, category,start_date,end_date)
+        now = time.time()
+        cache[key] = value
+        index[key] = {
+            "node": node,
+            "category": category,
+            "start_date": start_date,
+            "end_date": end_date,
+            "prompt_version": prompt_version or config.PROMPT_VERSION,
+            "model": model or config.llm_model_name_lite,
+            "requested_model": requested_model or model or config.llm_model_name_lite,
+            "created_at": now,
+            "last_access": now,
+            "hits": 0,
+            "size_bytes": _entry_size(value),
+        }
+        _merge_access(index)
+        _evict(cache, index, keep=key)
+        _save_all(cache)
+        _save_index(index)
+
+def entry_version(node: str, category: str, start_date: str, end_date: str) -> str:
+    """
+    version tag of a cache entry, changes whenever the entry is rewritten
+    entries without index row are tagged "legacy"
+    """
+    row = _load_index().get(_make_key(node, category, start_date, end_date))
+    if row is None:
+        return "legacy"
+    return f"{row.get('prompt_version')}:{row.get('model')}:{row.get('created_at')}"
+
+def query_cache(*prefix: str, **filters: Any) -> List[Dict[str,Any]]:
+    """
+    list index rows matching a prefix of INDEX_FIELDS and/or keyword filters
+    e.g. query_cache("product_summary", "Beer") or query_cache(category="Beer")
+    every returned row carries its cache "key"
+    """
+    if len(prefix) > len(INDEX_FIELDS):
+        raise ValueError(f"prefix can have at most {len(INDEX_FIELDS)} fields")
+    unknown = set(filters) - set(INDEX_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown index fields: {sorted(unknown)}")
+
+    match = dict(zip(INDEX_FIELDS, prefix))
+    match.update({k: v for k, v in filters.items() if v is not None})
+
+    rows = []
+    for key, row in _load_index().items():
+        if all(row.get(k) == v for k, v in match.items()):
+            rows.append({"key": key, **row})
+    return rows
+
+def downstream_nodes(node: str) -> List[str]:
+    """
+    return node and every node depending on it, in graph execution order
+    """
+    if node not in config.NODE_DEPENDENCIES:
+        raise ValueError(f"unknown node: {node}")
+    affected = {node}
+    for name, upstream in config.NODE_DEPENDENCIES.items():
+        if any(u in affected for u in upstream):
+            affected.add(name)
+    return [name for name in config.NODE_DEPENDENCIES if name in affected]
 
+def invalidate(node: str, category: Optional[str] = None, start_date: Optional[str] = None,
+               end_date: Optional[str] = None, cascade: bool = True) -> int:
+    """
+    drop cache entries of node (and its downstream nodes if cascade)
+    optionally limited to one category / date range, upstream work is kept
+    return number of entries removed
+    """
+    nodes = downstream_nodes(node) if cascade else [node]
+    with _write_lock:
+        cache = _load_all(strict=True)
+        index = _load_index(strict=True)
+        removed = 0
+        for name in nodes:
+            keys = {row["key"] for row in query_cache(name, category=category,
+                                                       start_date=start_date, end_date=end_date)}
+            # legacy entries have no index row but can still be found by exact key
+            if category and start_date and end_date:
+                keys.add(_make_key(name, category, start_date, end_date))
+            for key in keys:
+                index.pop(key, None)
+                if cache.pop(key, None) is not None:
+                    removed += 1
+        _save_all(cache)
+        _save_index(index)
+    return removed
+
+def compact_cache() -> Dict[str,Any]:
+    """
+    rewrite the store without expired entries and orphan index rows,
+    adopt legacy entries into the index and enforce CACHE_MAX_BYTES
+    readers keep using the old file until the atomic replace
+    """
+    started = time.perf_counter()
+    with _write_lock:
+        cache = _load_all(strict=True)
+        index = _load_index(strict=True)
+        now = time.time()
+
+        _merge_access(index)
+        # index rows whose entry is gone
+        for key in [k for k in index if k not in cache]:
+            index.pop(key)
 
+        # legacy entries start their TTL from the first compaction
+        for key, value in cache.items():
+            if key not in index:
+                index[key] = {"node": None, "created_at": now, "last_access": now,
+                              "hits": 0, "size_bytes": _entry_size(value)}
 
+        expired = [k for k, row in index.items() if _is_expired(row, now)]
+        for key in expired:
+            cache.pop(key, None)
+            index.pop(key, None)
+        _stats["expired"] += len(expired)
 
+        _evict(cache, index)
+        _save_all(cache)
+        _save_index(index)
 
+    _stats["last_compaction_seconds"] = time.perf_counter() - started
+    stats = cache_stats()
+    logger.info(f"[CACHE COMPACT] {stats}")
+    return stats
 
-    
+def start_background_compaction(interval: Optional[float] = None) -> threading.Thread:
+    """
+    run compact_cache every interval seconds on a daemon thread
+    """
+    interval = config.CACHE_COMPACTION_INTERVAL if interval is None else interval
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                compact_cache()
+            except Exception as e:
+                logger.exception(f"[CACHE COMPACT] failed: {e}")
+
+    thread = threading.Thread(target=_loop, name="cache-compaction", daemon=True)
+    thread.start()
+    return thread
+
+def cache_stats() -> Dict[str,Any]:
+    """
+    report cache size, entry count, evictions and last compaction duration
+    entries are counted from the index, legacy entries appear after compaction
+    """
+    size = os.path.getsize(CACHE_FILE) if os.path.exists(CACHE_FILE) else 0
+    return {
+        "entries": len(_load_index()),
+        "size_bytes": size,
+        "evictions": _stats["evictions"],
+        "expired": _stats["expired"],
+        "last_compaction_seconds": _stats["last_compaction_seconds"],
+    }
+
+def clear_cache() -> None:
+    "remove cache file and its index from local dir"
+    for path in (config.CACHE_FILE, config.CACHE_INDEX_FILE):
+        if os.path.exists(path):
+            os.remove(path)
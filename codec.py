@@ -0,0 +1,118 @@
+"""
+codec.py
+Objective : pluggable serialization for cache values and graph checkpoints
+    - codecs : "json" (stdlib), "orjson", "msgpack" (optional dependencies)
+    - encoded data starts with a header : MAGIC + schema version + codec id
+    - the json codec writes plain JSON without header, so cache.json stays a
+      JSON file; data without header is read as JSON (old cache.json included)
+"""
+
+import json
+from typing import Any, Optional, Tuple
+
+import config
+
+try:
+    import orjson
+except ImportError:  # optional, pip install orjson
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, pip install msgpack
+    msgpack = None
+
+MAGIC = b"MRC"
+SCHEMA_VERSION = 1
+CODEC_IDS = {"json": 1, "orjson": 2, "msgpack": 3}
+CODEC_NAMES = {v: k for k, v in CODEC_IDS.items()}
+
+
+def available_codecs():
+    """codecs usable in this environment"""
+    names = ["json"]
+    if orjson is not None:
+        names.append("orjson")
+    if msgpack is not None:
+        names.append("msgpack")
+    return names
+
+def resolve_codec(name: Optional[str] = None) -> str:
+    """configured codec, falling back to json when its package is missing"""
+    name = name or config.CACHE_CODEC
+    if name not in CODEC_IDS:
+        raise ValueError(f"unknown codec: {name}")
+    return name if name in available_codecs() else "json"
+
+def _dumps(obj: Any, name: str) -> bytes:
+    if name == "orjson":
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    if name == "msgpack":
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def _loads(payload: bytes, name: str) -> Any:
+    if name == "orjson":
+        return orjson.loads(payload)
+    if name == "msgpack":
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    return json.loads(payload)
+
+def encode(obj: Any, codec: Optional[str] = None) -> bytes:
+    """serialize obj, with header unless the codec is json"""
+    name = resolve_codec(codec)
+    if name == "json":
+        return _dumps(obj, name)
+    return MAGIC + bytes((SCHEMA_VERSION, CODEC_IDS[name])) + _dumps(obj, name)
+
+def decode(data: bytes) -> Any:
+    """deserialize data written by encode, or legacy plain JSON"""
+    if not data.startswith(MAGIC):
+        return json.loads(data)
+    version, codec_id = data[len(MAGIC)], data[len(MAGIC) + 1]
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"data written with newer schema version {version}")
+    name = CODEC_NAMES.get(codec_id)
+    if name is None:
+        raise ValueError(f"unknown codec id {codec_id}")
+    if name == "orjson" and orjson is None:
+        # orjson writes standard JSON, stdlib json reads it (just slower)
+        return json.loads(data[len(MAGIC) + 2:])
+    if name not in available_codecs():
+        raise ImportError(f"data needs the {name} package, please install it")
+    return _loads(data[len(MAGIC) + 2:], name)
+
+
+def _is_plain(obj: Any) -> bool:
+    """only str-keyed dict / list / scalars round trip unchanged through every codec"""
+    if obj is None or isinstance(obj, (str, bool, int, float)):
+        return True
+    if type(obj) is list:
+        return all(_is_plain(v) for v in obj)
+    if type(obj) is dict:
+        return all(isinstance(k, str) and _is_plain(v) for k, v in obj.items())
+    return False
+
+
+class CheckpointSerde:
+    """
+    LangGraph checkpoint serializer using the cache codec for plain data,
+    anything else (tuples, sets, pydantic models...) goes to JsonPlusSerializer
+    """
+    TYPE = "mrcodec"
+
+    def __init__(self, codec: Optional[str] = None):
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+        self.codec = codec
+        self.fallback = JsonPlusSerializer()
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if _is_plain(obj):
+            return self.TYPE, encode(obj, self.codec)
+        return self.fallback.dumps_typed(obj)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ == self.TYPE:
+            return decode(payload)
+        return self.fallback.loads_typed(data)
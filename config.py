@@ -3,6 +3,47 @@ import os
 llm_model_name = "gemini-2.5-flash"
 llm_model_name_lite = "gemini-2.5-flash-lite"
 
+# --- Model routing ---
+# default model per node, routing may still move a call to the other model
+NODE_MODELS = {
+    "generate_search_query": llm_model_name_lite,
+    "extract_products_name": llm_model_name_lite,
+    "product_summary": llm_model_name_lite,
+    "clean_products": llm_model_name_lite,
+    "create_final_summary": llm_model_name,
+}
+def node_model(node:str) -> str:
+    """default model of a node, lite model for unknown nodes"""
+    return NODE_MODELS.get(node, llm_model_name_lite)
+
+# rough cost (USD per 1k input tokens) and latency profile of each model
+MODEL_PROFILES = {
+    llm_model_name: {"cost_per_1k_tokens": 0.0003, "base_latency": 1.5, "latency_per_1k_tokens": 0.05},
+    llm_model_name_lite: {"cost_per_1k_tokens": 0.0001, "base_latency": 0.6, "latency_per_1k_tokens": 0.02},
+}
+# inputs above this many tokens go to the larger model when the budget allows
+ROUTER_LITE_MAX_TOKENS = 30000
+# per call budgets, None means unlimited
+ROUTER_LATENCY_BUDGET = None
+ROUTER_COST_BUDGET = None
+# retry on the larger model when lite output is not valid JSON
+ROUTER_CASCADE = True
+
+# --- Deadlines, timeouts and hedging ---
+# overall budget of one graph run, every LLM call gets at most the time left
+RUN_DEADLINE_SECONDS = 300
+LLM_CALL_TIMEOUT = 60
+# seconds of the run kept for the final nodes, earlier nodes stop (and return
+# partial output) once only this reserve is left
+DEADLINE_RESERVE_SECONDS = 2 * LLM_CALL_TIMEOUT
+DEADLINE_FINAL_NODES = ("clean_products", "create_final_summary")
+# retries per call, backoff is LLM_RETRY_BASE_DELAY * 2**attempt with jitter
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BASE_DELAY = 1.0
+# fire a second request when a call runs past the p95 latency of its model
+HEDGE_REQUESTS = True
+HEDGE_MIN_SAMPLES = 20
+
 START_DATE = None
 END_DATE = None
 def set_date_range(start_date:str,end_date:str):
@@ -29,6 +70,81 @@ search_tool_params = {
 prompt_file_name = os.path.join(os.getcwd(),"prompt_manager.yml")
 
 CACHE_FILE = "cache.json"
+CACHE_INDEX_FILE = "cache_index.json"
+# serialization of cache files and checkpoints: "json", "orjson" or "msgpack"
+# json keeps cache.json a plain JSON file, the others write a binary header
+# (falls back to json when the package is missing, old JSON files stay readable)
+CACHE_CODEC = "json"
+
+# bump when prompt_manager.yml changes so older cache entries are not reused
+PROMPT_VERSION = "v1"
+
+# cache expiry in seconds per node, search results go stale faster than reports
+CACHE_TTL_SECONDS = {
+    "generate_search_query": 7 * 24 * 3600,
+    "perfrom_web_search": 24 * 3600,
+    "extract_products_name": 3 * 24 * 3600,
+    "product_summary": 3 * 24 * 3600,
+    "clean_products": 7 * 24 * 3600,
+    "create_final_summary": 30 * 24 * 3600,
+}
+CACHE_DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# global byte budget of the cache store and eviction policy ("lru" or "lfu")
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+CACHE_EVICTION_POLICY = "lru"
+# seconds between background compaction passes
+CACHE_COMPACTION_INTERVAL = 15 * 60
+
+# the pipeline in execution order: graph node name => cache node name (the name of
+# its function in task_nodes), workflow.build_workflow wires the graph from it
+PIPELINE_NODES = {
+    "generate_query": "generate_search_query",
+    "web_search": "perfrom_web_search",
+    "extract_products": "extract_products_name",
+    "summaize_products": "product_summary",
+    "clean_products": "clean_products",
+    "final_summary": "create_final_summary",
+}
+# upstream dependency of every cached node, derived from the pipeline order
+# used to cascade cache invalidation to downstream nodes
+_cache_nodes = list(PIPELINE_NODES.values())
+NODE_DEPENDENCIES = {name: _cache_nodes[max(i - 1, 0):i] for i, name in enumerate(_cache_nodes)}
+
+# local SQLite checkpoint store for resumable graph runs
+CHECKPOINT_DB = "checkpoints.sqlite"
+# checkpoint every run even when no thread id is given
+ENABLE_CHECKPOINTING = False
+# a running run refreshes its heartbeat every RUN_HEARTBEAT_SECONDS, runs without
+# a heartbeat for RUN_HEARTBEAT_TIMEOUT are treated as interrupted (process died)
+RUN_HEARTBEAT_SECONDS = 15
+RUN_HEARTBEAT_TIMEOUT = 4 * RUN_HEARTBEAT_SECONDS
+
+# columnar store of completed runs (Parquet, partitioned by category and month)
+ANALYTICS_DIR = "analytics"
+
+# dashboard: insights / strategies per page and product table height (rows are virtualized)
+DASHBOARD_PAGE_SIZE = 10
+DASHBOARD_TABLE_HEIGHT = 600
+
+# --- Report HTTP API ---
+API_HOST = "127.0.0.1"
+API_PORT = 8080
+# seconds a serialized response is reused before the cache entry is checked again
+API_RESPONSE_TTL = 30
+# a failed pipeline job is queued again only after this delay, doubled per failure
+API_JOB_RETRY_DELAY = 300
+API_JOB_RETRY_MAX_DELAY = 6 * 3600
+
+# --- Cache warm-up ---
+# dashboard access log used to prioritize warm-up
+ACCESS_LOG_FILE = "access_log.json"
+WARMUP_ACCESS_WINDOW_DAYS = 28
+# number of rolling month windows (current month and the ones before it)
+WARMUP_MONTHS = 3
+# pipelines running at once and max estimated LLM spend (USD) of one warm-up
+WARMUP_CONCURRENCY = 2
+WARMUP_COST_BUDGET = 1.0
 
 category_selection = [
     "Energy Drinks",
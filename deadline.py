@@ -0,0 +1,59 @@
+"""
+deadline.py
+Objective : per run deadline shared by every node and LLM call of the run
+The deadline lives in a context variable, so it follows the run into the
+executor threads and asyncio.run loops used by the graph nodes
+Nodes before config.DEADLINE_FINAL_NODES leave config.DEADLINE_RESERVE_SECONDS
+of the deadline unused, so the run can always finish with the output it has
+"""
+
+import time
+import contextvars
+from typing import Optional
+
+import config
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("run_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """raised when a call starts or waits after the run deadline"""
+
+
+def start_deadline(seconds: Optional[float] = None) -> float:
+    """
+    set the deadline of the current run, seconds from now
+    return the absolute deadline (time.monotonic clock)
+    """
+    seconds = config.RUN_DEADLINE_SECONDS if seconds is None else seconds
+    deadline = time.monotonic() + seconds
+    _deadline.set(deadline)
+    return deadline
+
+def node_reserve(node: str) -> float:
+    """seconds of the deadline node must leave for the final nodes"""
+    return 0.0 if node in config.DEADLINE_FINAL_NODES else config.DEADLINE_RESERVE_SECONDS
+
+def time_left(reserve: float = 0.0) -> Optional[float]:
+    """seconds until the deadline minus reserve, None when no deadline is set"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - reserve - time.monotonic()
+
+def deadline_exceeded(reserve: float = 0.0) -> bool:
+    left = time_left(reserve)
+    return left is not None and left <= 0
+
+def call_timeout(timeout: Optional[float] = None, reserve: float = 0.0) -> float:
+    """
+    timeout of one call: the per call timeout capped by the time left
+    raise DeadlineExceeded if no time is left
+    """
+    timeout = config.LLM_CALL_TIMEOUT if timeout is None else timeout
+    left = time_left(reserve)
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("run deadline exceeded")
+    return min(timeout, left)
@@ -0,0 +1,209 @@
+"""
+llm_router.py
+Objective : pick the Gemini model for every LLM call
+    - default model per node (config.NODE_MODELS)
+    - move to larger / smaller model based on input tokens and latency/cost budget
+    - cascade : escalate lite output to the larger model when it is not valid JSON
+Every call is recorded with its routing decision and latency
+Calls get a timeout, retries with jitter and a hedged second request, all
+bounded by the run deadline (see deadline.py)
+"""
+
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_google_genai import GoogleGenerativeAI
+
+import config
+from utils import parse_llm_json_output, safe_content
+from deadline import DeadlineExceeded, call_timeout, node_reserve, time_left
+
+logger = logging.getLogger(__name__)
+
+# last routing decisions, see routing_log()
+_records = deque(maxlen=1000)
+_llms: Dict[str, GoogleGenerativeAI] = {}
+# recent successful call latencies per model, used for hedging
+_latencies: Dict[str, deque] = {}
+# estimated spend (USD) of every call made by this process
+_spent = {"cost": 0.0}
+
+
+def get_llm(model: str) -> GoogleGenerativeAI:
+    """return (and build once) the llm client of a model"""
+    if model not in _llms:
+        _llms[model] = GoogleGenerativeAI(model=model)
+    return _llms[model]
+
+def default_model(node: str) -> str:
+    """default model of a node, lite model for unknown nodes"""
+    return config.node_model(node)
+
+def estimate_tokens(inputs: Dict[str, Any]) -> int:
+    """rough token count of prompt inputs (~4 chars per token)"""
+    return sum(len(str(v)) for v in inputs.values()) // 4
+
+def estimate_cost(model: str, input_tokens: int) -> float:
+    return config.MODEL_PROFILES[model]["cost_per_1k_tokens"] * input_tokens / 1000
+
+def estimate_latency(model: str, input_tokens: int) -> float:
+    profile = config.MODEL_PROFILES[model]
+    return profile["base_latency"] + profile["latency_per_1k_tokens"] * input_tokens / 1000
+
+def _within_budget(model: str, input_tokens: int, latency_budget: Optional[float],
+                   cost_budget: Optional[float]) -> bool:
+    if latency_budget is not None and estimate_latency(model, input_tokens) > latency_budget:
+        return False
+    if cost_budget is not None and estimate_cost(model, input_tokens) > cost_budget:
+        return False
+    return True
+
+def choose_model(node: str, input_tokens: int, latency_budget: Optional[float] = None,
+                 cost_budget: Optional[float] = None) -> Dict[str, str]:
+    """
+    return {"model": ..., "reason": ...} for a call of node with input_tokens
+    """
+    latency_budget = config.ROUTER_LATENCY_BUDGET if latency_budget is None else latency_budget
+    cost_budget = config.ROUTER_COST_BUDGET if cost_budget is None else cost_budget
+    full, lite = config.llm_model_name, config.llm_model_name_lite
+    model = default_model(node)
+
+    if model == full and not _within_budget(full, input_tokens, latency_budget, cost_budget):
+        return {"model": lite, "reason": "over budget on full model"}
+    if model == lite and input_tokens > config.ROUTER_LITE_MAX_TOKENS \
+            and _within_budget(full, input_tokens, latency_budget, cost_budget):
+        return {"model": full, "reason": f"input over {config.ROUTER_LITE_MAX_TOKENS} tokens"}
+    return {"model": model, "reason": "node default"}
+
+def _record(node: str, model: str, reason: str, input_tokens: int, started: float,
+            ok: bool, escalated: bool = False) -> None:
+    record = {
+        "node": node,
+        "model": model,
+        "reason": reason,
+        "input_tokens": input_tokens,
+        "latency_seconds": round(time.perf_counter() - started, 3),
+        "escalated": escalated,
+        "ok": ok,
+    }
+    _records.append(record)
+    logger.info(f"[ROUTER] {record}")
+
+def _charge(model: str, input_tokens: int) -> None:
+    """add the estimated cost of one request sent, every retry and hedge is charged"""
+    _spent["cost"] += estimate_cost(model, input_tokens)
+
+def _needs_escalation(model: str, content: Any, expect_json: bool, cascade: Optional[bool]) -> bool:
+    cascade = config.ROUTER_CASCADE if cascade is None else cascade
+    if not (cascade and expect_json and model == config.llm_model_name_lite):
+        return False
+    return not isinstance(content, str) or parse_llm_json_output(content) is None
+
+def _p95_latency(model: str) -> Optional[float]:
+    """p95 of recent successful call latencies, None until enough samples"""
+    samples = sorted(_latencies.get(model, ()))
+    if len(samples) < config.HEDGE_MIN_SAMPLES:
+        return None
+    return samples[int(0.95 * (len(samples) - 1))]
+
+async def _hedged(chain, inputs: Dict[str, Any], model: str, input_tokens: int) -> Any:
+    """
+    run the call, fire a second identical request once it passes the p95
+    latency of the model, first successful answer wins
+    """
+    _charge(model, input_tokens)
+    tasks = {asyncio.ensure_future(chain.ainvoke(inputs))}
+    try:
+        hedge_after = _p95_latency(model) if config.HEDGE_REQUESTS else None
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                logger.info(f"[ROUTER] hedging {model} call after {hedge_after:.2f}s")
+                _charge(model, input_tokens)
+                tasks.add(asyncio.ensure_future(chain.ainvoke(inputs)))
+
+        pending, error = tasks, None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _ainvoke_with_policy(model: str, prompt, inputs: Dict[str, Any], reserve: float = 0.0) -> Any:
+    """
+    one LLM call with timeout, bounded retries with jitter and hedging,
+    all limited by the run deadline minus reserve
+    """
+    chain = prompt | get_llm(model)
+    tokens = estimate_tokens(inputs)
+    for attempt in range(config.LLM_MAX_RETRIES + 1):
+        timeout = call_timeout(reserve=reserve)
+        started = time.perf_counter()
+        try:
+            out = await asyncio.wait_for(_hedged(chain, inputs, model, tokens), timeout)
+            _latencies.setdefault(model, deque(maxlen=200)).append(time.perf_counter() - started)
+            return safe_content(out)
+        except Exception as e:
+            if attempt == config.LLM_MAX_RETRIES:
+                raise
+            delay = config.LLM_RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+            left = time_left(reserve)
+            if left is not None and delay >= left:
+                raise DeadlineExceeded("run deadline exceeded before retry") from e
+            logger.warning(f"[ROUTER] {model} call failed ({e!r}), retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def ainvoke_routed(node: str, prompt, inputs: Dict[str, Any], expect_json: bool = False,
+                         cascade: Optional[bool] = None) -> Tuple[Any, str]:
+    """
+    run prompt | llm on the routed model
+    return (output content, model that produced it) - the model differs from
+    the node default after a budget downgrade or a cascade escalation
+    """
+    tokens = estimate_tokens(inputs)
+    route = choose_model(node, tokens)
+    reserve = node_reserve(node)
+    started = time.perf_counter()
+    try:
+        content = await _ainvoke_with_policy(route["model"], prompt, inputs, reserve=reserve)
+    except Exception:
+        _record(node, route["model"], route["reason"], tokens, started, ok=False)
+        raise
+    _record(node, route["model"], route["reason"], tokens, started, ok=True)
+
+    if _needs_escalation(route["model"], content, expect_json, cascade):
+        started = time.perf_counter()
+        try:
+            content = await _ainvoke_with_policy(config.llm_model_name, prompt, inputs, reserve=reserve)
+        except Exception:
+            _record(node, config.llm_model_name, "lite output not valid JSON", tokens, started,
+                    ok=False, escalated=True)
+            raise
+        _record(node, config.llm_model_name, "lite output not valid JSON", tokens, started,
+                ok=True, escalated=True)
+        return content, config.llm_model_name
+    return content, route["model"]
+
+def invoke_routed(node: str, prompt, inputs: Dict[str, Any], expect_json: bool = False,
+                  cascade: Optional[bool] = None) -> Tuple[Any, str]:
+    """
+    sync version of ainvoke_routed for sync nodes
+    nodes run in executor threads, so there is no running event loop here
+    """
+    return asyncio.run(ainvoke_routed(node, prompt, inputs, expect_json=expect_json, cascade=cascade))
+
+def total_estimated_cost() -> float:
+    """estimated spend (USD) of all calls made by this process"""
+    return _spent["cost"]
+
+def routing_log() -> List[Dict[str, Any]]:
+    """return the recorded routing decisions, oldest first"""
+    return list(_records)
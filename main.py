@@ -1,4 +1,4 @@
-from workflow import run_graph
+from workflow import run_graph, list_runs
 import config
 from argparse import ArgumentParser
 
@@ -7,16 +7,25 @@ parser = ArgumentParser()
 parser.add_argument("--category",help="Category for want insights")
 parser.add_argument("--start_date",help="from date you want insight")
 parser.add_argument("--end_date",help="Till which date you want insights")
+parser.add_argument("--thread_id",help="Run id, checkpoint every node of the run under this id")
+parser.add_argument("--resume",action="store_true",help="Resume the run given by --thread_id")
+parser.add_argument("--list_runs",action="store_true",help="List checkpointed runs")
 
 args = parser.parse_args()
 
-start_date = args[1]
-end_date= args[2]
-category = args[0]
+if args.list_runs:
+    for run in list_runs():
+        status = "running" if run["live"] else "interrupted"
+        print(f"{run['thread_id']} | {run['category']} | {run['start_date']} - {run['end_date']} | {status}")
+elif args.resume:
+    results = run_graph(state={}, thread_id=args.thread_id, resume=True)
+    print("Final report:", results.get("final_report"))
+else:
+    config.set_date_range(end_date=args.end_date, start_date=args.start_date)
 
-config.set_date_range(end_date=end_date, start_date=start_date)
-
-state = {"category":category}
-results = run_graph(state=state)
-print("From cache?", results.get("_from_cache"))
-print("Final report:", results.get("final_report"))
+    state = {"category":args.category}
+    results = run_graph(state=state, thread_id=args.thread_id)
+    print("From cache?", results.get("_from_cache"))
+    if results.get("_thread_id"):
+        print("Thread id:", results.get("_thread_id"))
+    print("Final report:", results.get("final_report"))
@@ -0,0 +1,236 @@
+"""
+report_api.py
+Objective : lightweight read API over the cache, no Streamlit session needed
+    GET /report/{category}?start=YYYY-MM-DD&end=YYYY-MM-DD   => final report
+    GET /products/{category}?start=YYYY-MM-DD&end=YYYY-MM-DD => final product summaries
+    - serialized (and gzipped) responses are kept per cache entry version
+    - ETag / If-None-Match => 304, Accept-Encoding: gzip supported
+    - cache miss => 202, the pipeline is queued as a background job
+      (known categories and valid dates only, failed jobs retry with backoff)
+Run locally : python report_api.py --port 8080
+"""
+
+import asyncio
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import time
+from argparse import ArgumentParser
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import config
+from cache_utils import _make_key, entry_version, get_current_from_cache, has_current_entry
+from workflow import run_graph_async
+
+logger = logging.getLogger(__name__)
+
+# resource => (cache node, field of the cached value)
+RESOURCES = {
+    "report": ("create_final_summary", "final_report"),
+    "products": ("clean_products", "final_product_summaries"),
+}
+
+# (resource, cache key) => {"version", "checked_at", "etag", "body", "gzip"}
+_responses: Dict[Tuple[str, str], Dict[str, Any]] = {}
+# (category, start, end) => job status, jobs run one at a time on _job_queue
+_jobs: Dict[Tuple[str, str, str], str] = {}
+# failed jobs => (failures, time the job may be queued again)
+_job_backoff: Dict[Tuple[str, str, str], Tuple[int, float]] = {}
+_job_queue: Optional[asyncio.Queue] = None
+# cache reads in progress, concurrent requests for one entry share a single read
+_inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 304: "Not Modified", 400: "Bad Request",
+               404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def _serialize(payload: Any) -> Dict[str, Any]:
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return {
+        "etag": '"' + hashlib.sha1(body).hexdigest() + '"',
+        "body": body,
+        "gzip": gzip.compress(body, compresslevel=6),
+    }
+
+def _load_response(resource: str, category: str, start: str, end: str) -> Optional[Dict[str, Any]]:
+    """
+    serialized response of a cache entry, rebuilt only when the entry version
+    changes; None on cache miss. Blocking, runs in the executor
+    the memo is reused only while its indexed entry is still current and not
+    expired, legacy entries (no index row) are read from the cache again
+    """
+    node, field = RESOURCES[resource]
+    key = _make_key(node, category, start, end)
+    memo = _responses.get((resource, key))
+    now = time.time()
+    version = entry_version(node, category, start, end)
+    if memo and memo["version"] == version != "legacy" and has_current_entry(node, category, start, end):
+        memo["checked_at"] = now
+        return memo
+
+    cached = get_current_from_cache(node, category, start, end)
+    if not cached:
+        _responses.pop((resource, key), None)
+        return None
+    payload = cached.get(field) if isinstance(cached, dict) else cached
+    memo = {"version": version, "checked_at": now, **_serialize(payload)}
+    _responses[(resource, key)] = memo
+    return memo
+
+async def get_response(resource: str, category: str, start: str, end: str) -> Optional[Dict[str, Any]]:
+    """
+    fresh serialized responses are served straight from memory, otherwise
+    the cache is read once in the executor for all concurrent requests
+    """
+    slot = (resource, _make_key(RESOURCES[resource][0], category, start, end))
+    memo = _responses.get(slot)
+    if memo and time.time() - memo["checked_at"] < config.API_RESPONSE_TTL:
+        return memo
+    if slot not in _inflight:
+        loop = asyncio.get_running_loop()
+        _inflight[slot] = loop.run_in_executor(None, _load_response, resource, category, start, end)
+    try:
+        return await _inflight[slot]
+    finally:
+        _inflight.pop(slot, None)
+
+async def _job_worker() -> None:
+    """
+    run queued pipelines one by one, the date range is a global of config
+    so two runs with different ranges must not overlap
+    """
+    while True:
+        job = await _job_queue.get()
+        category, start, end = job
+        _jobs[job] = "running"
+        try:
+            config.set_date_range(start, end)
+            await run_graph_async({"category": category})
+            # a partial (deadline) run caches nothing, count it as failed so backoff applies
+            missing = [node for node, _ in RESOURCES.values() if not has_current_entry(node, category, start, end)]
+            if missing:
+                raise RuntimeError(f"run finished without cache entries for {missing}")
+            _jobs.pop(job, None)
+            _job_backoff.pop(job, None)
+            logger.info(f"[API] job done {job}")
+        except Exception as e:
+            failures = _job_backoff.get(job, (0, 0.0))[0] + 1
+            delay = min(config.API_JOB_RETRY_DELAY * 2 ** (failures - 1), config.API_JOB_RETRY_MAX_DELAY)
+            _job_backoff[job] = (failures, time.time() + delay)
+            _jobs[job] = f"failed: {e}"
+            logger.exception(f"[API] job failed {job} ({failures}x), retry after {delay}s: {e}")
+        finally:
+            _job_queue.task_done()
+
+def _enqueue(category: str, start: str, end: str) -> str:
+    job = (category, start, end)
+    status = _jobs.get(job)
+    if status in ("queued", "running"):
+        return status
+    if job in _job_backoff and time.time() < _job_backoff[job][1]:
+        return status
+    _jobs[job] = "queued"
+    _job_queue.put_nowait(job)
+    return "queued"
+
+def _check_selection(category: str, start: str, end: str) -> Tuple[str, str]:
+    """
+    return start / end as YYYY-MM-DD (the form used in cache keys)
+    raise ValueError for a selection the pipeline must not run for
+    """
+    if category not in config.category_selection:
+        raise ValueError(f"unknown category, use one of {config.category_selection}")
+    try:
+        start_date, end_date = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+    except ValueError:
+        raise ValueError("start and end must be dates as YYYY-MM-DD") from None
+    if start_date > end_date:
+        raise ValueError("start must not be after end")
+    return start_date.isoformat(), end_date.isoformat()
+
+def _response(status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> bytes:
+    headers = {"Content-Type": "application/json", "Content-Length": str(len(body)),
+               "Connection": "close", **(headers or {})}
+    head = f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+    return head.encode("latin-1") + b"\r\n" + body
+
+def _json_response(status: int, payload: Dict[str, Any]) -> bytes:
+    return _response(status, json.dumps(payload).encode("utf-8"))
+
+async def handle_request(method: str, target: str, headers: Dict[str, str]) -> bytes:
+    """route one request and return the raw HTTP response"""
+    if method != "GET":
+        return _json_response(405, {"error": "only GET is supported"})
+
+    url = urlsplit(target)
+    parts = [unquote(p) for p in url.path.strip("/").split("/")]
+    if len(parts) != 2 or parts[0] not in RESOURCES:
+        return _json_response(404, {"error": "use /report/{category} or /products/{category}"})
+    resource, category = parts
+    query = parse_qs(url.query)
+    start, end = query.get("start", [None])[0], query.get("end", [None])[0]
+    if not (start and end):
+        return _json_response(400, {"error": "start and end query parameters are required"})
+    try:
+        start, end = _check_selection(category, start, end)
+    except ValueError as e:
+        return _json_response(400, {"error": str(e)})
+
+    memo = await get_response(resource, category, start, end)
+    if memo is None:
+        status = _enqueue(category, start, end)
+        return _json_response(202, {"status": status, "category": category, "start": start, "end": end})
+
+    common = {"ETag": memo["etag"], "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if headers.get("if-none-match") == memo["etag"]:
+        return _response(304, headers=common)
+    if "gzip" in headers.get("accept-encoding", ""):
+        return _response(200, memo["gzip"], {**common, "Content-Encoding": "gzip"})
+    return _response(200, memo["body"], common)
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        raw = await reader.readuntil(b"\r\n\r\n")
+        lines = raw.decode("latin-1").split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        response = await handle_request(method, target, headers)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+        response = _json_response(400, {"error": "malformed request"})
+    except Exception as e:
+        logger.exception(f"[API] request failed: {e}")
+        response = _json_response(500, {"error": "internal error"})
+    try:
+        writer.write(response)
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def serve(host: str = None, port: int = None) -> None:
+    global _job_queue
+    _job_queue = asyncio.Queue()
+    worker = asyncio.create_task(_job_worker())
+    server = await asyncio.start_server(_handle_connection, host or config.API_HOST,
+                                        port or config.API_PORT, backlog=1024)
+    logger.info(f"[API] serving on {server.sockets[0].getsockname()}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--host", help="bind address")
+    parser.add_argument("--port", type=int, help="port to listen on")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
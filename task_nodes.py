@@ -1,5 +1,4 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import GoogleGenerativeAI
 from langchain_tavily import TavilySearch
 from typing import List, Dict, Any, Union
 import asyncio
@@ -12,6 +11,8 @@ from graph_state import AgentState
 import config
 from utils import *
 from cache_utils import *
+from llm_router import invoke_routed, ainvoke_routed, default_model
+from deadline import deadline_exceeded, node_reserve
 
 # --- Set up logging ---
 logging.basicConfig(level=logging.INFO)
@@ -24,15 +25,58 @@ os.environ["GOOGLE_API_KEY"]  = os.getenv("GOOGLE_API_KEY")
 
 # --- Initialization ---
 Prompts_list = load_prompts(config.prompt_file_name)
-llm = GoogleGenerativeAI(model=config.llm_model_name_lite)
 search_tool = TavilySearch(**config.search_tool_params)
 
 
+def answered_by(res:Any, node_name:str) -> str:
+    """
+    pop the "_model" a node reports (models that answered its LLM calls),
+    nodes without LLM calls are recorded with their default model
+    """
+    models = res.pop("_model", None) if isinstance(res, dict) else None
+    if isinstance(models, (set, list, tuple)):
+        models = ",".join(sorted(m for m in models if m))
+    return models or default_model(node_name)
+
+def _state_meta(state:Any) -> dict:
+    meta = state.get("meta") if isinstance(state, dict) else getattr(state, "meta", None)
+    return meta or {}
+
+def _skip_partial(state:Any, res:Any, node_name:str) -> bool:
+    """
+    True when res must not be cached: the node returned "_partial", or it was
+    built on partial upstream output (meta["partial"] set by an earlier node)
+    a partial node flags meta so every downstream node skips the cache too
+    """
+    partial = isinstance(res, dict) and res.pop("_partial", False)
+    if partial:
+        res["meta"] = {**_state_meta(state), "partial": True}
+    elif not _state_meta(state).get("partial"):
+        return False
+    if isinstance(res, dict):
+        res.pop("_model", None)
+    logger.warning(f"[CACHE SKIP] {node_name} output is partial, deadline reached")
+    return True
+
+def _save_to_cache(node_name:str, category:str, start_date:str, end_date:str, res:Any) -> None:
+    """cache a node result, a failed write is logged and never fails the node"""
+    model = answered_by(res,node_name)
+    try:
+        set_to_cache(node_name,category,start_date,end_date,res,
+                     prompt_version=config.PROMPT_VERSION,model=model,
+                     requested_model=default_model(node_name))
+        logger.info(f"[CACHE SAVE] {node_name} for {category} | {start_date} - {end_date}")
+    except Exception as e:
+        logger.exception(f"[CACHE SAVE FAILED] {node_name} for {category} | {start_date} - {end_date}: {e}")
+
 def node_cache(node_name:str):
     """
     Decorator that provides
         - Node level caching
         - on-execption : return last cache value merged with error message
+        - partial output (node returned "_partial") and everything built on it
+          downstream is passed on but not cached
+        - the index records the model(s) that answered (node returned "_model")
     Work with for both sync and async node functions
 
     """
@@ -41,8 +85,7 @@ def node_cache(node_name:str):
         if is_async(func=func):
             async def wrapper(state:dict,*args, **kwargs):
                 category,start_date,end_date = get_cat_and_date_from_states(state)
-                cache = get_from_cache(node=node_name,category=category,start_date=start_date,
-                                       end_date=end_date)
+                cache = get_current_from_cache(node_name,category,start_date,end_date)
                 if cache is not None:
                     logger.info(f"[CACHE HIT] {node_name} for {category} | {start_date} - {end_date}")
                     return cache
@@ -50,8 +93,9 @@ def node_cache(node_name:str):
                 logger.info(f"[CACHE MISS] {node_name} for {category} | {start_date} - {end_date}") 
                 try:
                     res = await func(state, *args, **kwargs)
-                    set_to_cache(node_name,category,start_date,end_date,res)
-                    logger.info(f"[CACHE SAVE] {node_name} for {category} | {start_date} - {end_date}")
+                    if _skip_partial(state,res,node_name):
+                        return res
+                    _save_to_cache(node_name,category,start_date,end_date,res)
                     return res
                 except Exception as e:
                     logger.exception(f"Node {node_name} failed:{e}")
@@ -66,8 +110,7 @@ def node_cache(node_name:str):
         else:
             def wrapper(state, *args, **kwargs):
                 category,start_date,end_date = get_cat_and_date_from_states(state)
-                cache = get_from_cache(node=node_name,category=category,start_date=start_date,
-                                       end_date=end_date)
+                cache = get_current_from_cache(node_name,category,start_date,end_date)
                 if cache is not None:
                     logger.info(f"[CACHE HIT] {node_name} for {category} | {start_date} - {end_date}")
                     return cache
@@ -75,8 +118,9 @@ def node_cache(node_name:str):
                 logger.info(f"[CACHE MISS] {node_name} for {category} | {start_date} - {end_date}") 
                 try:
                  res =  func(state, *args, **kwargs)
-                 set_to_cache(node_name,category,start_date,end_date,res)
-                 logger.info(f"[CACHE SAVE] {node_name} for {category} | {start_date} - {end_date}")
+                 if _skip_partial(state,res,node_name):
+                     return res
+                 _save_to_cache(node_name,category,start_date,end_date,res)
                  return res
                 except Exception as e:
                     logger.exception(f"Node {node_name} failed:{e}")
@@ -95,13 +139,11 @@ def generate_search_query(state: Any) -> Dict[str, Union[str, List[str]]]:
     """Uses llm to generate a search query."""
     query_template = Prompts_list['chat_templates']['search_query_prompts']
     query_prompt = ChatPromptTemplate.from_messages(query_template)
-    query_chain = query_prompt | llm
     
     category = state.category if hasattr(state, "category") else state["category"]
-    out = query_chain.invoke({"category":category})
-    final_query = safe_content(out)
+    final_query, model = invoke_routed("generate_search_query", query_prompt, {"category":category})
     logger.info(f"Generated Search Query: {final_query}")
-    return {"query": final_query, "messages": [f"Query Generated: {final_query}"]}
+    return {"query": final_query, "messages": [f"Query Generated: {final_query}"], "_model": model}
 
 # --- Node 2 : Web Search ----
 @node_cache("perfrom_web_search")
@@ -124,7 +166,6 @@ async def _extract_products_name_async(state: Any) -> Dict[str,Any]:
     """
     extract_template = Prompts_list["chat_templates"]["identify_products"]
     extraction_prompt = ChatPromptTemplate.from_messages(extract_template)
-    extraction_chain = extraction_prompt | llm
     raw_search_result = getattr(state, "search_result", None) or (state["search_result"] if isinstance(state, dict) else None)
     category = state.category if hasattr(state, "category") else state["category"]
 
@@ -137,16 +178,17 @@ async def _extract_products_name_async(state: Any) -> Dict[str,Any]:
     
     #product_list: List[Dict[int,Union[str,None]]] = []
     sem = asyncio.Semaphore(3)
+    models = set()
 
     async def process_page(page):
         async with sem:
             try:
                 web_text = get_web_content(page=page)
-                out = await extraction_chain.ainvoke({
+                content, model = await ainvoke_routed("extract_products_name", extraction_prompt, {
                     "text": web_text,
                     "category": category
                 })
-                content = safe_content(out)
+                models.add(model)
                 return content
             except Exception as e:
                 print("Extraction error page: %s", e)
@@ -160,7 +202,11 @@ async def _extract_products_name_async(state: Any) -> Dict[str,Any]:
     page_results = await asyncio.gather(*tasks, return_exceptions=False)
     mapped = {i: page_results[i] for i in range(len(page_results))}
     print("Extracted products for %d pages", len(page_results))
-    return {"products": mapped}
+    if deadline_exceeded(node_reserve("extract_products_name")):
+        # keep the pages finished before the deadline instead of failing the run
+        logger.warning(f"[Extract] deadline reached, {sum(r is not None for r in page_results)} pages completed")
+        return {"products": mapped, "_partial": True}
+    return {"products": mapped, "_model": models}
 
 @node_cache("extract_products_name")
 def extract_products_name(state: Any) -> Dict[str, Any]:
@@ -174,7 +220,6 @@ async def _product_summary_async(state: Any) -> Dict[str,Any]:
     """
     summary_template = Prompts_list["chat_templates"]["summarize_product"]
     summary_prompt = ChatPromptTemplate.from_messages(summary_template)
-    summary_chain = summary_prompt | llm
 
     products_map = getattr(state, "products", None) or (state["products"] if isinstance(state, dict) else None)
     raw_search_result = getattr(state, "search_result", None) or (state["search_result"] if isinstance(state, dict) else None)
@@ -192,16 +237,17 @@ async def _product_summary_async(state: Any) -> Dict[str,Any]:
     summaries = []
     #set number of thread async process
     sem = asyncio.Semaphore(config.NO_OF_THREADS)
+    models = set()
 
     async def summarize_one(prod_name: str,page: str):
         async with sem:
             try:
-                out = await summary_chain.ainvoke({
+                content, model = await ainvoke_routed("product_summary", summary_prompt, {
                     "data": page,
                     "product": prod_name,
                     "category": category
-                })
-                content = safe_content(out)
+                }, expect_json=True)
+                models.add(model)
                 parsed = parse_llm_json_output(content)
 
                 # try to extract Product_Analysis if present
@@ -220,7 +266,10 @@ async def _product_summary_async(state: Any) -> Dict[str,Any]:
     results = await asyncio.gather(*tasks, return_exceptions=False)
     summaries.extend(results)
     logging.info("Generated %d product summaries", len(summaries))
-    return {"product_summaries": summaries}
+    if deadline_exceeded(node_reserve("product_summary")):
+        logger.warning(f"[Summary] deadline reached, {sum(r['analysis'] is not None for r in results)} summaries completed")
+        return {"product_summaries": summaries, "_partial": True}
+    return {"product_summaries": summaries, "_model": models}
 
 @node_cache("product_summary")
 def product_summary(state: Any) -> Dict[str, Any]:
@@ -254,16 +303,23 @@ def clean_products(state:Any):
 
     duplicate_removal_prompt = Prompts_list["chat_templates"]["duplicate_removal"]
     dup_clean_template = ChatPromptTemplate.from_messages(duplicate_removal_prompt)
-    dup_clean_chain = dup_clean_template | llm
 
-    final_product_list = dup_clean_chain.invoke({"category": category,"product":names})
+    try:
+        final_product_list, model = invoke_routed("clean_products", dup_clean_template,
+                                           {"category": category,"product":names}, expect_json=True)
+    except Exception:
+        if not deadline_exceeded():
+            raise
+        # no time left to clean, pass the summaries on as they are
+        logger.warning("[Product Clean] deadline reached, passing summaries on uncleaned")
+        return {"final_product_summaries": summaries, "_partial": True}
     # get the final Product list
     try:
-        clean_products = parse_llm_json_output(safe_content(final_product_list))
+        clean_products = parse_llm_json_output(final_product_list)
     except Exception as e:
         logger.exception(f"[clean Product] Error in Parsing output=={e}")
         clean_products = final_product_list
-    return {"final_product_summaries":clean_products}
+    return {"final_product_summaries":clean_products, "_model": model}
 
 ### Node 6 ====== Clean and Final Summary
 @node_cache("create_final_summary")
@@ -280,14 +336,21 @@ def create_final_summary(state:Any):
  
     final_summary_prompt = Prompts_list["chat_templates"]["final_summary"]
     summary_template = ChatPromptTemplate.from_messages(final_summary_prompt)
-    summary_chain = summary_template | llm 
-    out = summary_chain.invoke({"category": category, "data": final_products})
     try:
-        final_report = parse_llm_json_output(safe_content(out))
+        out, model = invoke_routed("create_final_summary", summary_template,
+                                   {"category": category, "data": final_products}, expect_json=True)
+    except Exception:
+        if not deadline_exceeded():
+            raise
+        # no time left, the run still returns the product summaries it has
+        logger.warning("[final Summary] deadline reached, no final report")
+        return {"final_report": None, "_partial": True}
+    try:
+        final_report = parse_llm_json_output(out)
     except Exception as e:
         logger.exception("[final Summary] Error in parsing {e}")
         final_report = out
 
     print("Final summary created.")
-    return {"final_report": final_report}
+    return {"final_report": final_report, "_model": model}
 
@@ -110,6 +110,30 @@ def extract_store_strategy(report_data):
     """Extracts the store owner placement strategy into a list of dictionaries."""
     return report_data.get('Actionable_Strategy', {}).get('Store_Owner_Placement_Strategy', [])
 
+def flatten_product_summaries(product_summaries):
+    """
+    return a flat list of product dicts from either
+    [{"analysis": [{"Product_Name": ...}]}] or [{"Product_Name": ...}]
+    """
+    if not product_summaries or not isinstance(product_summaries, list):
+        return []
+    if isinstance(product_summaries[0], dict) and "analysis" in product_summaries[0]:
+        flat = []
+        for item in product_summaries:
+            if "analysis" in item and isinstance(item["analysis"], list):
+                flat.extend(item["analysis"])
+        return flat
+    return product_summaries
+
+def product_brand(product_name):
+    """brand part of names like "Ghost - cherry limeade" or "Doritos+Flamin' Hot" """
+    if not isinstance(product_name, str):
+        return None
+    for sep in ("+", " - "):
+        if sep in product_name:
+            return product_name.split(sep, 1)[0].strip()
+    return product_name.strip()
+
 def extract_product_summaries(full_data):
     """Extracts the final product summaries into a DataFrame."""
     df = pd.DataFrame(full_data.get('final_product_summaries', []))
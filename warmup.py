@@ -0,0 +1,157 @@
+"""
+warmup.py
+Objective : precompute final reports before users open the dashboard
+    - every category of config.category_selection x rolling month windows
+    - plus the selections users opened recently (access log written by app.py)
+    - skip selections with a fresh final report in cache
+    - most accessed selections first, under a concurrency and cost budget
+Run it from a scheduler, e.g. cron every Monday 5am:
+    0 5 * * 1 cd /path/to/repo && python warmup.py
+"""
+
+import asyncio
+import datetime
+import json
+import logging
+import time
+from argparse import ArgumentParser
+from typing import Any, Dict, List, Tuple
+
+from atomicwrites import atomic_write
+
+import config
+from cache_utils import has_current_entry
+from llm_router import total_estimated_cost
+from workflow import run_graph_async
+
+logger = logging.getLogger(__name__)
+
+Selection = Tuple[str, str, str]  # category, start_date, end_date
+
+
+def _access_key(category: str, start_date: str, end_date: str) -> str:
+    return f"{category}|{start_date}|{end_date}"
+
+def _load_access_log() -> Dict[str, List[float]]:
+    try:
+        with open(config.ACCESS_LOG_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def record_access(category: str, start_date: str, end_date: str) -> None:
+    """
+    log one dashboard access of a selection, entries older than
+    WARMUP_ACCESS_WINDOW_DAYS are dropped on write
+    """
+    now = time.time()
+    oldest = now - config.WARMUP_ACCESS_WINDOW_DAYS * 24 * 3600
+    log = _load_access_log()
+    log = {k: [t for t in v if t >= oldest] for k, v in log.items()}
+    log.setdefault(_access_key(category, start_date, end_date), []).append(now)
+    log = {k: v for k, v in log.items() if v}
+    with atomic_write(config.ACCESS_LOG_FILE, overwrite=True, encoding="utf-8") as f:
+        json.dump(log, f, indent=2)
+
+def access_frequency(days: int = None) -> Dict[Selection, int]:
+    """number of dashboard accesses per selection in the last days"""
+    days = config.WARMUP_ACCESS_WINDOW_DAYS if days is None else days
+    oldest = time.time() - days * 24 * 3600
+    freq = {}
+    for key, stamps in _load_access_log().items():
+        count = sum(t >= oldest for t in stamps)
+        if count:
+            category, start_date, end_date = key.split("|")
+            freq[(category, start_date, end_date)] = count
+    return freq
+
+def month_windows(months: int = None, today: datetime.date = None) -> List[Tuple[str, str]]:
+    """
+    rolling month windows, newest first
+    a window is (first of month, first of month), same as the dashboard default
+    selection, so warmed keys are the ones users hit
+    """
+    months = config.WARMUP_MONTHS if months is None else months
+    first = (today or datetime.date.today()).replace(day=1)
+    windows = []
+    for _ in range(months):
+        key = first.strftime("%Y-%m-%d")
+        windows.append((key, key))
+        first = (first - datetime.timedelta(days=1)).replace(day=1)
+    return windows
+
+def is_fresh(category: str, start_date: str, end_date: str) -> bool:
+    """
+    final report cached, not expired and built with the current prompts / model
+    checked on the index, so planning does not count as cache hits
+    """
+    return has_current_entry("create_final_summary", category, start_date, end_date)
+
+def plan_warmup(months: int = None) -> List[Selection]:
+    """
+    selections to warm, most accessed first, fresh ones skipped
+    """
+    freq = access_frequency()
+    candidates = {(c, s, e) for c in config.category_selection for s, e in month_windows(months)}
+    candidates |= set(freq)
+    plan = [sel for sel in candidates if not is_fresh(*sel)]
+    # most accessed first, then newest window
+    plan.sort(key=lambda sel: (freq.get(sel, 0), sel[1]), reverse=True)
+    return plan
+
+async def warm_up_async(months: int = None, concurrency: int = None, cost_budget: float = None) -> Dict[str, Any]:
+    """
+    run the pipeline for every planned selection, strictly in priority order
+    the date range is global (config.START_DATE / END_DATE), so consecutive
+    selections of one window run concurrently and the running ones finish
+    before the next selection switches to another window
+    """
+    concurrency = config.WARMUP_CONCURRENCY if concurrency is None else concurrency
+    cost_budget = config.WARMUP_COST_BUDGET if cost_budget is None else cost_budget
+    plan = plan_warmup(months)
+    logger.info(f"[WARMUP] {len(plan)} selections to warm")
+
+    spent_before = total_estimated_cost()
+    summary = {"planned": len(plan), "warmed": 0, "failed": 0, "skipped_budget": 0}
+
+    async def warm_one(category: str):
+        if total_estimated_cost() - spent_before >= cost_budget:
+            summary["skipped_budget"] += 1
+            return
+        try:
+            await run_graph_async({"category": category})
+            summary["warmed"] += 1
+            logger.info(f"[WARMUP] warmed {category} | {config.START_DATE} - {config.END_DATE}")
+        except Exception as e:
+            summary["failed"] += 1
+            logger.exception(f"[WARMUP] {category} failed: {e}")
+
+    running, window = set(), None
+    for category, start_date, end_date in plan:
+        if (start_date, end_date) != window:
+            if running:
+                await asyncio.wait(running)
+                running = set()
+            window = (start_date, end_date)
+            config.set_date_range(start_date, end_date)
+        while len(running) >= concurrency:
+            _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        running.add(asyncio.ensure_future(warm_one(category)))
+    if running:
+        await asyncio.wait(running)
+
+    summary["estimated_cost"] = round(total_estimated_cost() - spent_before, 4)
+    logger.info(f"[WARMUP] done {summary}")
+    return summary
+
+def warm_up(months: int = None, concurrency: int = None, cost_budget: float = None) -> Dict[str, Any]:
+    return asyncio.run(warm_up_async(months, concurrency, cost_budget))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--months", type=int, help="number of rolling month windows")
+    parser.add_argument("--concurrency", type=int, help="pipelines running at once")
+    parser.add_argument("--cost_budget", type=float, help="max estimated LLM spend in USD")
+    args = parser.parse_args()
+    print(warm_up(args.months, args.concurrency, args.cost_budget))
@@ -1,59 +1,226 @@
 from task_nodes import *
+import task_nodes
 import asyncio
 import logging
+import uuid
+import time
+from contextlib import asynccontextmanager
 from langgraph.graph import StateGraph,END
 import config
 from graph_state import AgentState
 from cache_utils import *
+from deadline import start_deadline
+from analytics_store import append_run
+from codec import CheckpointSerde
+
+try:
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+except ImportError:  # optional, install langgraph-checkpoint-sqlite
+    AsyncSqliteSaver = None
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def build_workflow():
+def build_workflow(checkpointer=None):
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("generate_query",generate_search_query)
-    workflow.add_node("web_search",perfrom_web_search)
-    workflow.add_node("extract_products",extract_products_name)
-    workflow.add_node("summaize_products",product_summary)
-    workflow.add_node("clean_products",clean_products)
-    workflow.add_node("final_summary",create_final_summary)
+    # nodes and edges come from config.PIPELINE_NODES, the same order cache invalidation cascades along
+    names = list(config.PIPELINE_NODES)
+    for name, cache_node in config.PIPELINE_NODES.items():
+        workflow.add_node(name,getattr(task_nodes,cache_node))
+
+    workflow.set_entry_point(names[0])
+    for upstream, downstream in zip(names, names[1:]):
+        workflow.add_edge(upstream,downstream)
+    workflow.add_edge(names[-1],END)
+
+    return workflow.compile(checkpointer=checkpointer)
+
+@asynccontextmanager
+async def open_checkpointer():
+    """
+    open the local SQLite checkpointer (config.CHECKPOINT_DB)
+    """
+    if AsyncSqliteSaver is None:
+        raise ImportError("Checkpointing needs langgraph-checkpoint-sqlite, please install it")
+    async with AsyncSqliteSaver.from_conn_string(config.CHECKPOINT_DB) as saver:
+        # plain state values use the cache codec, other types keep the default serializer
+        saver.serde = CheckpointSerde()
+        await saver.setup()
+        # one small row per unfinished run, so listing runs never decodes checkpoints
+        await saver.conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs (thread_id TEXT PRIMARY KEY, category TEXT,"
+            " start_date TEXT, end_date TEXT, started_at REAL, status TEXT, heartbeat REAL)")
+        async with saver.conn.execute("PRAGMA table_info(runs)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        for column, kind in (("status", "TEXT"), ("heartbeat", "REAL")):
+            if column not in columns:
+                await saver.conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {kind}")
+        await saver.conn.commit()
+        yield saver
+
+async def _execute(saver, sql:str, params:tuple) -> None:
+    # the saver lock keeps our writes out of the checkpointer's transactions
+    async with saver.lock:
+        await saver.conn.execute(sql, params)
+        await saver.conn.commit()
+
+@asynccontextmanager
+async def _track_run(saver, thread_id:str, category:str):
+    """
+    mark the run live while it executes: status "running" plus a heartbeat
+    refreshed every RUN_HEARTBEAT_SECONDS, "interrupted" once it stops
+    """
+    now = time.time()
+    await _execute(saver,
+        "INSERT INTO runs VALUES (?, ?, ?, ?, ?, 'running', ?)"
+        " ON CONFLICT(thread_id) DO UPDATE SET status = 'running', heartbeat = excluded.heartbeat",
+        (thread_id, category, config.START_DATE, config.END_DATE, now, now))
+
+    async def beat():
+        while True:
+            await asyncio.sleep(config.RUN_HEARTBEAT_SECONDS)
+            await _execute(saver, "UPDATE runs SET heartbeat = ? WHERE thread_id = ?", (time.time(), thread_id))
+
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+        await _execute(saver, "UPDATE runs SET status = 'interrupted' WHERE thread_id = ?", (thread_id,))
+
+def _is_live(status:str, heartbeat:float) -> bool:
+    return status == "running" and heartbeat is not None \
+        and time.time() - heartbeat < config.RUN_HEARTBEAT_TIMEOUT
+
+async def _prune_run(saver, thread_id:str) -> None:
+    """drop checkpoints and run row of a completed thread, its output lives in the cache"""
+    async with saver.lock:
+        for table in ("checkpoints", "writes", "runs"):
+            await saver.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        await saver.conn.commit()
+
+def _store_analytics(res:dict, run_id:str=None) -> None:
+    """append a completed run to the analytics store, never fails the run"""
+    if not res.get("final_report") or (res.get("meta") or {}).get("partial"):
+        return
+    try:
+        append_run(res, res.get("category"), config.START_DATE, config.END_DATE, run_id=run_id)
+    except Exception as e:
+        logger.exception(f"[ANALYTICS] could not store run: {e}")
 
-    workflow.set_entry_point("generate_query")
-    workflow.add_edge("generate_query","web_search")
-    workflow.add_edge("web_search","extract_products")
-    workflow.add_edge("extract_products","summaize_products")
-    workflow.add_edge("summaize_products","clean_products")
-    workflow.add_edge("clean_products","final_summary")
-    workflow.add_edge("final_summary",END)
+def new_thread_id() -> str:
+    """return a new run / thread id"""
+    return uuid.uuid4().hex
 
-    return workflow.compile()
+def _thread_config(thread_id:str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
 
-async def run_graph_async(state:dict):
+async def run_graph_async(state:dict, thread_id:str=None, resume:bool=False):
     """
     run the complied Langgraph, Behaviour,
+    - resume=True => continue thread_id from its last completed node
     - if final summary exist in cache => return cache result
     - else run the graph (node level cache)
+    - with thread_id (or config.ENABLE_CHECKPOINTING) every node is checkpointed
+    - the run gets config.RUN_DEADLINE_SECONDS, shared by every LLM call
     """
+    if resume:
+        if not thread_id:
+            raise ValueError("Please provide thread_id of the run to resume")
+        return await resume_run_async(thread_id)
+
     if not(config.START_DATE and config.END_DATE):
         raise ValueError("Please set start date and end date")
     category = state.get("category")
     if not category:
         raise ValueError("Please ensure state must have one category")
-    
-    cache_final = get_from_cache("create_final_summary",category,config.START_DATE,config.END_DATE)
-    if cache_final:
+
+    cache_final = get_current_from_cache("create_final_summary",category,config.START_DATE,config.END_DATE)
+    cache_products = get_current_from_cache("clean_products",category,config.START_DATE,config.END_DATE)
+    if cache_final and cache_products:
         logger.info("[Graph] Final summary found in state in cache - return immediately")
-        result_state = {**state,**cache_final}
+        result_state = {**state,**cache_products,**cache_final}
         result_state["_from_cache"] = True
         return result_state
-    
-    graph = build_workflow()
-    logger.info("[graph] NO cache - start graph execution ")
-    res = await graph.ainvoke(state)
+    if cache_final:
+        # product list expired or was evicted, rebuild the final summary on the new list
+        logger.info("[Graph] Final summary cached without its product list - rebuilding both")
+        invalidate("create_final_summary",category,config.START_DATE,config.END_DATE,cascade=False)
+
+    start_deadline()
+    if thread_id is None and not config.ENABLE_CHECKPOINTING:
+        graph = build_workflow()
+        logger.info("[graph] NO cache - start graph execution ")
+        res = await graph.ainvoke(state)
+        _store_analytics(res)
+        res["_from_cache"] = False
+        return res
+
+    thread_id = thread_id or new_thread_id()
+    # keep the date range in state so a resumed run uses the same cache keys
+    meta = {**state.get("meta", {}), "start_date": config.START_DATE, "end_date": config.END_DATE}
+    state = {**state, "meta": meta}
+    async with open_checkpointer() as saver:
+        graph = build_workflow(checkpointer=saver)
+        logger.info(f"[graph] NO cache - start graph execution, thread {thread_id}")
+        async with _track_run(saver, thread_id, category):
+            res = await graph.ainvoke(state, _thread_config(thread_id))
+        await _prune_run(saver, thread_id)
+    _store_analytics(res, run_id=thread_id)
     res["_from_cache"] = False
+    res["_thread_id"] = thread_id
     return res
 
-def run_graph(state:dict):
-    return asyncio.run(run_graph_async(state))
+async def resume_run_async(thread_id:str):
+    """
+    resume an interrupted run from its last checkpoint
+    a run still executing (live heartbeat) is never resumed a second time
+    """
+    async with open_checkpointer() as saver:
+        async with saver.conn.execute("SELECT status, heartbeat FROM runs WHERE thread_id = ?",
+                                      (thread_id,)) as cursor:
+            row = await cursor.fetchone()
+        if row and _is_live(*row):
+            raise ValueError(f"Run {thread_id} is still executing, it can be resumed once it stops")
+        graph = build_workflow(checkpointer=saver)
+        run_config = _thread_config(thread_id)
+        snapshot = await graph.aget_state(run_config)
+        if not snapshot.values:
+            raise ValueError(f"No checkpointed run found for thread {thread_id}")
+
+        meta = snapshot.values.get("meta") or {}
+        config.set_date_range(start_date=meta.get("start_date"), end_date=meta.get("end_date"))
+        if snapshot.next:
+            start_deadline()
+            logger.info(f"[graph] resuming thread {thread_id} at {list(snapshot.next)}")
+            # invoking with None input continues from the saved checkpoint
+            async with _track_run(saver, thread_id, snapshot.values.get("category")):
+                res = await graph.ainvoke(None, run_config)
+            _store_analytics(res, run_id=thread_id)
+        else:
+            logger.info(f"[graph] thread {thread_id} already completed")
+            res = dict(snapshot.values)
+        await _prune_run(saver, thread_id)
+    res["_from_cache"] = False
+    res["_thread_id"] = thread_id
+    return res
+
+async def list_runs_async():
+    """
+    list unfinished checkpointed runs (completed runs are pruned), newest first
+    "live" runs are still executing somewhere and must not be resumed
+    """
+    async with open_checkpointer() as saver:
+        async with saver.conn.execute(
+                "SELECT thread_id, category, start_date, end_date, started_at, status, heartbeat"
+                " FROM runs ORDER BY started_at DESC") as cursor:
+            rows = await cursor.fetchall()
+    return [{"thread_id": r[0], "category": r[1], "start_date": r[2], "end_date": r[3], "started_at": r[4],
+             "live": _is_live(r[5], r[6])} for r in rows]
+
+def run_graph(state:dict, thread_id:str=None, resume:bool=False):
+    return asyncio.run(run_graph_async(state, thread_id=thread_id, resume=resume))
 
+def list_runs():
+    return asyncio.run(list_runs_async())